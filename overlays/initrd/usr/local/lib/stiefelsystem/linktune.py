@@ -0,0 +1,350 @@
+"""
+stiefellink tuning, shared by stiefel-server and stiefel-client.
+
+configured through the kernel cmdline:
+
+stiefel_linkprofile=default|throughput|latency
+    offload, interrupt coalescing and sysctl settings to apply.
+stiefel_mtu=auto|<bytes>
+    'auto' probes the largest MTU that works between server and client.
+stiefel_linktest=0|1
+    whether the client measures throughput and latency before booting
+    (default 0, it delays the boot).
+
+the chosen settings are passed on to the stiefeled system through its
+kernel cmdline (see kexec_cmdline()), so its initrd hooks can apply them
+to stiefellink again.
+"""
+import json
+import os
+import re
+import subprocess
+import time
+import urllib.request
+
+
+# each profile is a dict of
+# 'offloads': ethtool -K features
+# 'coalesce': ethtool -C parameters
+# 'sysctl': /proc/sys entries
+PROFILES = {
+    # leave everything as the kernel and driver set it up
+    'default': {
+        'offloads': {},
+        'coalesce': {},
+        'sysctl': {},
+    },
+    # bulk transfers: large socket buffers, all offloads,
+    # moderate interrupt coalescing
+    'throughput': {
+        'offloads': {
+            'sg': 'on',
+            'tso': 'on',
+            'gso': 'on',
+            'gro': 'on',
+        },
+        'coalesce': {
+            'adaptive-rx': 'off',
+            'rx-usecs': '50',
+        },
+        'sysctl': {
+            'net/core/rmem_max': '16777216',
+            'net/core/wmem_max': '16777216',
+            'net/core/netdev_max_backlog': '5000',
+            'net/ipv4/tcp_rmem': '4096 1048576 16777216',
+            'net/ipv4/tcp_wmem': '4096 1048576 16777216',
+        },
+    },
+    # small random accesses: no coalescing, busy polling on sockets
+    'latency': {
+        'offloads': {
+            'gro': 'off',
+        },
+        'coalesce': {
+            'adaptive-rx': 'off',
+            'rx-usecs': '0',
+            'tx-usecs': '0',
+        },
+        'sysctl': {
+            'net/core/busy_read': '50',
+            'net/core/busy_poll': '50',
+        },
+    },
+}
+
+# the MTU every ethernet link supports
+BASE_MTU = 1500
+
+# the largest MTU that is commonly supported by jumbo frame capable
+# switches and NICs. drivers may allow more (virtio: 65521), but probing
+# that is pointless on real hardware.
+JUMBO_MTU = 9000
+
+# seconds to wait for a reply to an MTU probe.
+# the stiefellink is a direct cable, so replies arrive within microseconds.
+PROBE_TIMEOUT = 0.2
+
+# IPv6 + ICMPv6 header size, subtracted from the MTU for ping payloads
+PING_OVERHEAD = 48
+
+
+def get_profile(name):
+    """
+    returns the profile with the given name
+    """
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(f"unknown link profile {name!r}") from None
+
+
+def check_profile(name):
+    """
+    returns the name if it is a known profile, and 'default' otherwise.
+
+    for validating the stiefel_linkprofile setting: a typo shall not
+    prevent booting, like any other tuning failure.
+    """
+    if name not in PROFILES:
+        print(f"unknown link profile {name!r}, using 'default'")
+        return 'default'
+    return name
+
+
+def apply_sysctls(profile_name):
+    """
+    applies the system-wide settings of the profile
+    """
+    for key, value in get_profile(profile_name)['sysctl'].items():
+        print(f"sysctl {key} = {value}")
+        try:
+            with open(f'/proc/sys/{key}', 'w') as sysctl_file:
+                sysctl_file.write(value)
+        except OSError as exc:
+            print(f"could not set sysctl {key}: {exc!r}")
+
+
+def apply_profile(netdev, profile_name):
+    """
+    applies the offload and coalescing settings of the profile to the link.
+
+    not all drivers support all settings; failures are only reported.
+    """
+    profile = get_profile(profile_name)
+    for option, settings in (('-K', profile['offloads']),
+                             ('-C', profile['coalesce'])):
+        if not settings:
+            continue
+        cmd = ['ethtool', option, netdev]
+        for key, value in settings.items():
+            cmd.extend([key, value])
+        print(f"tuning link {netdev!r}: {' '.join(cmd)}")
+        try:
+            subprocess.check_call(cmd)
+        except (OSError, subprocess.CalledProcessError) as exc:
+            print(f"could not tune link {netdev!r}: {exc!r}")
+
+
+def max_mtu(netdev):
+    """
+    returns the largest MTU the driver of the link supports,
+    but at most JUMBO_MTU.
+    """
+    info = json.loads(subprocess.check_output(
+        ['ip', '-d', '-j', 'link', 'show', 'dev', netdev]
+    ))
+    return min(info[0].get('max_mtu', BASE_MTU), JUMBO_MTU)
+
+
+def set_mtu(netdev, mtu):
+    """
+    sets the MTU of the link
+    """
+    print(f"setting MTU of {netdev!r} to {mtu}")
+    subprocess.check_call(['ip', 'link', 'set', 'dev', netdev, 'mtu', str(mtu)])
+
+
+def ping(host, mtu=BASE_MTU, count=1, interval=None, timeout=1):
+    """
+    pings the host with non-fragmentable packets that fill the given MTU.
+
+    returns the output of ping, or None if no reply arrived.
+    """
+    cmd = ['ping', '-6', '-n', '-q', '-M', 'do', '-W', str(timeout),
+           '-c', str(count), '-s', str(mtu - PING_OVERHEAD)]
+    if interval is not None:
+        cmd.extend(['-i', str(interval)])
+    cmd.append(host)
+    proc = subprocess.run(cmd, stdout=subprocess.PIPE,
+                          stderr=subprocess.DEVNULL)
+    if proc.returncode != 0:
+        return None
+    return proc.stdout.decode()
+
+
+def wait_reachable(host, timeout=10):
+    """
+    waits until the host answers pings, e.g. after the link was
+    reset by an MTU change.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if ping(host) is not None:
+            return True
+    return False
+
+
+def probe_mtu(netdev, host):
+    """
+    finds the largest MTU that works between this link and the host.
+
+    raises the link MTU to max_mtu(), then probes with
+    non-fragmentable pings. the peer must have raised its MTU as well;
+    stiefel-server does so for all links.
+
+    the maximum is tried first, since it usually works. if even the
+    smallest step above BASE_MTU fails, the path has no jumbo frames
+    and the probe stops there. only otherwise it bisects.
+    """
+    high = max_mtu(netdev)
+    if high <= BASE_MTU:
+        return BASE_MTU
+
+    set_mtu(netdev, high)
+    if not wait_reachable(host):
+        print(f"{host!r} became unreachable after raising the MTU")
+        return BASE_MTU
+
+    def probe(mtu):
+        return ping(host, mtu, timeout=PROBE_TIMEOUT) is not None
+
+    if probe(high):
+        return high
+    if not probe(BASE_MTU + 1):
+        return BASE_MTU
+
+    low = BASE_MTU + 1
+    high -= 1
+    while low < high:
+        mid = (low + high + 1) // 2
+        if probe(mid):
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+
+def choose_mtu(netdev, host, setting):
+    """
+    applies the MTU according to the stiefel_mtu setting,
+    and returns it.
+    """
+    if setting == 'auto':
+        mtu = probe_mtu(netdev, host)
+        print(f"largest working MTU to {host!r}: {mtu}")
+    else:
+        mtu = int(setting)
+    set_mtu(netdev, mtu)
+    wait_reachable(host)
+    return mtu
+
+
+def ping_stats(host, count, interval=0.01):
+    """
+    pings the host count times.
+
+    returns a dict with the round-trip time statistics in milliseconds,
+    which is empty if the host did not reply.
+    """
+    output = ping(host, count=count, interval=interval)
+    match = output and re.search(r'= ([\d.]+)/([\d.]+)/([\d.]+)/([\d.]+) ms', output)
+    if not match:
+        return {}
+    return {
+        'rtt-min-ms': float(match.group(1)),
+        'rtt-avg-ms': float(match.group(2)),
+        'rtt-max-ms': float(match.group(3)),
+        'rtt-mdev-ms': float(match.group(4)),
+    }
+
+
+def link_info(netdev):
+    """
+    returns the negotiated speed (in Mbit/s, -1 if unknown)
+    and duplex mode of the link.
+    """
+    def read(name, default):
+        try:
+            with open(f'/sys/class/net/{netdev}/{name}') as info_file:
+                return info_file.read().strip()
+        except OSError:
+            # e.g. EINVAL for wireless links
+            return default
+
+    try:
+        speed = int(read('speed', '-1'))
+    except ValueError:
+        speed = -1
+    return {
+        'speed': speed,
+        'duplex': read('duplex', 'unknown'),
+    }
+
+
+def link_test(host, http_url, size=8 * 1024 ** 2, samples=20):
+    """
+    measures round-trip time to the host and the throughput of the
+    server's /linktest download.
+
+    returns a dict with the results.
+    """
+    result = ping_stats(host, count=samples)
+
+    start = time.monotonic()
+    received = 0
+    with urllib.request.urlopen(f'{http_url}/linktest?size={size}', timeout=10) as req:
+        while True:
+            chunk = req.read(1024 ** 2)
+            if not chunk:
+                break
+            received += len(chunk)
+    duration = time.monotonic() - start
+    result['throughput-mbit-s'] = received * 8 / duration / 1000 ** 2
+
+    for key, value in result.items():
+        print(f"link test: {key}: {value:.3f}")
+    return result
+
+
+def kexec_cmdline(mtu, profile_name):
+    """
+    returns the cmdline arguments that tell the initrd hooks of the
+    stiefeled system how to set up stiefellink.
+
+    sysctls are passed as sysctl.* arguments, which the kernel applies
+    by itself (linux >= 5.8).
+    """
+    profile = get_profile(profile_name)
+    args = [f'stiefel_mtu={mtu}']
+
+    def join(settings):
+        return ','.join(f'{key}:{value}' for key, value in settings.items())
+
+    if profile['offloads']:
+        args.append(f'stiefel_ethtool_k={join(profile["offloads"])}')
+    if profile['coalesce']:
+        args.append(f'stiefel_ethtool_c={join(profile["coalesce"])}')
+    for key, value in profile['sysctl'].items():
+        key = key.replace('/', '.')
+        if ' ' in value:
+            value = f'"{value}"'
+        args.append(f'sysctl.{key}={value}')
+
+    return ' '.join(args)
+
+
+def is_tunable(netdev):
+    """
+    returns True if the link is a physical link that should be tuned
+    """
+    return os.path.exists(f'/sys/class/net/{netdev}/device')
@@ -9,6 +9,12 @@ while read -r line; do
 		kver="${kver%'/pkgbase'}"
 
 		install -Dm0644 "/${line%'/pkgbase'}/vmlinuz" "/boot/vmlinuz-${pkgbase}"
-		dracut "${args[@]}" --no-hostonly "/boot/initramfs-stiefel.img" --add " nbd " --kver "$kver"
+
+		# only regenerate the image if its inputs changed, see setup-server-os
+		inputs=(/etc/dracut.conf /etc/dracut.conf.d "/boot/vmlinuz-${pkgbase}" "kver=${kver}")
+		if ! /usr/local/bin/stiefel-initramfs-inputs check "/boot/initramfs-stiefel.img" "${inputs[@]}"; then
+			dracut "${args[@]}" --no-hostonly "/boot/initramfs-stiefel.img" --add " nbd " --kver "$kver" &&
+				/usr/local/bin/stiefel-initramfs-inputs record "/boot/initramfs-stiefel.img" "${inputs[@]}"
+		fi
 	fi
 done
@@ -4,5 +4,6 @@ while read -r line; do
 	if [[ "$line" == 'usr/lib/modules/'+([^/])'/pkgbase' ]]; then
 		read -r pkgbase < "/${line}"
 		rm -f "/boot/vmlinuz-${pkgbase}" "/boot/initramfs-stiefel.img"
+		/usr/local/bin/stiefel-initramfs-inputs forget "/boot/initramfs-stiefel.img"
 	fi
 done
@@ -1,6 +1,7 @@
 /**
  * When an adapter with the given mac address is connected, this tool
  * automatically renames it to the given name, and sets it up.
+ * If an MTU is given, it is applied before setting the interface up.
  *
  * Platform-specific for Linux.
  * Requires no external tools or filesystem structure.
@@ -82,6 +83,24 @@ int set_if_up(const char *ifname, int up) {
     return 0;
 }
 
+/**
+ * sets the MTU of the interface.
+ *
+ * returns 0 on success, -1 on failure.
+ * calls perror() on failure.
+ */
+int set_if_mtu(const char *ifname, int mtu) {
+    struct ifreq ifr;
+    explicit_bzero(&ifr, sizeof(ifr));
+    ifnamcpy(ifr.ifr_name, ifname);
+    ifr.ifr_mtu = mtu;
+    if (ioctl(socket_fd, SIOCSIFMTU, &ifr) < 0) {
+        perror("SIOCSIFMTU");
+        return -1;
+    }
+    return 0;
+}
+
 /**
  * checks whether the interface is up.
  *
@@ -214,7 +233,7 @@ int parse_mac(const char *mac_string, char *mac) {
     return 0;
 }
 
-void handle(const char *link_name, const char *mac) {
+void handle(const char *link_name, const char *mac, int mtu) {
     int res = test_if_up(link_name);
     // TODO: as soon as IFF_UP is set in the interface flags,
     // we must perform some post-up action (e.g. add it to the wireguard cfg)
@@ -226,6 +245,10 @@ void handle(const char *link_name, const char *mac) {
     if (res == 0) {
         // interface is down, set it up
         printf("interface '%s' is down; setting up\n", link_name);
+        if (mtu > 0) {
+            printf("setting MTU of '%s' to %d\n", link_name, mtu);
+            set_if_mtu(link_name, mtu);
+        }
         set_if_up(link_name, 1);
         return;
     }
@@ -262,12 +285,19 @@ void handle(const char *link_name, const char *mac) {
 int main(int argc, char **argv) {
     // parse arguments
     char mac[6];
-    if (argc != 3 || parse_mac(argv[1], mac) < 0) {
-        fprintf(stderr, "usage: %s mac linkname\n", argv[0]);
+    if (argc < 3 || argc > 4 || parse_mac(argv[1], mac) < 0) {
+        fprintf(stderr, "usage: %s mac linkname [mtu]\n", argv[0]);
         return 1;
     }
     const char *link_name = argv[2];
 
+    // optional MTU, as chosen by the stiefellink tuning
+    int mtu = 0;
+    if (argc == 4 && (sscanf(argv[3], "%d", &mtu) != 1 || mtu < 68)) {
+        fprintf(stderr, "invalid mtu: %s\n", argv[3]);
+        return 1;
+    }
+
     // open socket_fd
     socket_fd = socket(AF_INET, SOCK_DGRAM, IPPROTO_IP);
     if (socket_fd < 0) {
@@ -276,7 +306,7 @@ int main(int argc, char **argv) {
     }
 
     while (1) {
-        handle(link_name, mac);
+        handle(link_name, mac, mtu);
 
         // yay, sleep-based polling!
         // the better solution would be to use udev, but this tool starts
@@ -1,6 +1,7 @@
 """
 Utilities for use by the various scripts.
 """
+import difflib
 import io
 import multiprocessing
 import os
@@ -274,16 +275,14 @@ class FileEditor:
 
         if os.path.exists(self.write_to):
             # the file will be overwritten
-            proc = subprocess.Popen(
-                ['diff', '--color', '-u', self.write_to, '-'],
-                stdin=subprocess.PIPE
-            )
-            proc.communicate(self.data)
-            if proc.returncode == 0:
+            with open(self.write_to, 'rb') as fileobj:
+                old_data = fileobj.read()
+            if old_data == self.data:
                 # nothing to do
                 print(f'{self.write_to!r}: unchanged')
                 self.ensure_x_flag(need_consent=True)
                 return False
+            print_diff(old_data, self.data, self.write_to)
 
             backup_to = self.write_to + '-stiefelbup'
             warn(f'{self.write_to!r}: overwriting; backing up old version to {backup_to!r}')
@@ -406,6 +405,62 @@ class FileEditor:
         self.data = data
 
 
+def print_diff(old, new, filename):
+    """
+    prints a colored unified diff between the two versions of the file
+    """
+    if b'\0' in old or b'\0' in new:
+        print(f'binary file {filename} differs')
+        return
+
+    colors = {'+': '\x1b[32m', '-': '\x1b[31m', '@': '\x1b[36m'}
+    for line in difflib.unified_diff(
+            old.decode('utf-8', errors='replace').splitlines(),
+            new.decode('utf-8', errors='replace').splitlines(),
+            filename, '-', lineterm=''):
+        color = colors.get(line[:1])
+        if color is None:
+            print(line)
+        else:
+            print(f'{color}{line}\x1b[m')
+
+
+# the same tool is used by the initramfs hook scripts on the server OS
+INITRAMFS_INPUTS_TOOL = 'overlays/server-os-generic/usr/local/bin/stiefel-initramfs-inputs'
+
+
+def initramfs_outdated(image, inputs):
+    """
+    Returns True if the initramfs image doesn't exist, or if any of its
+    inputs (files, directories or name=value literals) changed since
+    it was generated.
+    """
+    return command(INITRAMFS_INPUTS_TOOL, 'check', image, *inputs,
+                   get_retval=True) != 0
+
+
+def initramfs_generated(image, inputs):
+    """
+    Records the inputs of the freshly generated initramfs image.
+    """
+    command(INITRAMFS_INPUTS_TOOL, 'record', image, *inputs)
+
+
+def initramfs_binary(name, path=None):
+    """
+    Returns the initramfs input for a binary that the initramfs hooks
+    copy into the image if it is installed: the binary itself,
+    or a name=missing literal if it isn't installed.
+
+    path is where the hook looks for it; by default it is searched in PATH.
+    """
+    if path is None:
+        path = shutil.which(name)
+    if path is None or not os.path.exists(path):
+        return f'{name}=missing'
+    return path
+
+
 def install_folder(source, dest="/"):
     """
     install the folder at 'source' to 'dest'.